@@ -21,7 +21,9 @@ def load_model(checkpoint, device):
     if not checkpoint:
         return None
 
-    checkpoint = torch.load(checkpoint, map_location=device)
+    # mmap lets the kernel page the checkpoint in on demand instead of reading it all upfront,
+    # the weights are moved to the device once the model is built
+    checkpoint = torch.load(checkpoint, map_location="cpu", mmap=True)
 
     args = AttributeDict(checkpoint)
     model = get_model(args)
@@ -38,23 +40,144 @@ def load_model(checkpoint, device):
     return model, text_tokens
 
 
+QUANTIZATION_MODES = ("none", "bf16", "int8")
+
+
+def quantize_model(model, quantization, device):
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization {quantization!r}, expected one of {QUANTIZATION_MODES}")
+
+    if quantization == "int8":
+        # Dynamic int8 linear kernels only exist for CPU
+        if device.type != "cpu":
+            raise ValueError("int8 quantization is only supported on CPU")
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    return model
+
+
+def lm_autocast(device, quantization):
+    # bf16 matmuls, on CUDA autocast keeps LayerNorm and softmax in fp32
+    return torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=quantization == "bf16")
+
+
 def prepare_inference(checkpoint_path, args, prompt_audio):
     device = torch.device("cpu")
     if torch.cuda.is_available():
         device = torch.device("cuda", 0)
 
     model, text_tokens = load_model(checkpoint_path, device)
+    model = quantize_model(model, getattr(args, "quantization", "none"), device)
+
+    # The AR decoder runs once per generated frame, compile it when requested.
+    # The sequence grows by one frame per step, so shapes must stay dynamic.
+    if getattr(args, "compile", False):
+        model.ar_decoder = torch.compile(model.ar_decoder, dynamic=True)
+
     text_collater = get_text_token_collater(args.tokens_file)
     audio_tokenizer = AudioTokenizer(mbd=args.mbd)
     alef_bert_tokenizer = AlefBERTRootTokenizer(vocab_file=args.vocab_file)
 
+    audio_prompts = encode_audio_prompt(prompt_audio, audio_tokenizer, device)
+
+    return device, model, text_collater, audio_tokenizer, alef_bert_tokenizer, audio_prompts
+
+def encode_audio_prompt(prompt_audio, audio_tokenizer, device):
     audio_prompts = []
     encoded_frames = tokenize_audio(audio_tokenizer, prompt_audio)
     audio_prompts.append(encoded_frames[0][0])
-    audio_prompts = torch.concat(audio_prompts, dim=-1).transpose(2, 1).to(device)
+    # Moved to the device once here, every later inference call reuses this tensor as is
+    return torch.concat(audio_prompts, dim=-1).transpose(2, 1).to(device)
 
-    return device, model, text_collater, audio_tokenizer, alef_bert_tokenizer, audio_prompts
 
+def prepare_prompt(prompt_text, text_collater, alef_bert_tokenizer):
+    prompt_text_without_space = [replace_chars(f"{prompt_text}").strip().replace(" ", "_")]
+    prompt_tokens = alef_bert_tokenizer._tokenize(prompt_text_without_space)
+    _, enroll_x_lens = text_collater([prompt_tokens])
+
+    return enroll_x_lens
+
+
+def generate_frames(
+    text,
+    prompt_text,
+    enroll_x_lens,
+    device,
+    model,
+    text_collater,
+    alef_bert_tokenizer,
+    audio_prompts,
+    top_k=50,
+    temperature=1,
+    quantization="none",
+):
+    text_without_space = [replace_chars(f"{prompt_text} {text}").strip().replace(" ", "_")]
+    tokens = alef_bert_tokenizer._tokenize(text_without_space)
+
+    text_tokens, text_tokens_lens = text_collater([tokens])
+
+    with lm_autocast(device, quantization):
+        return model.inference(
+            text_tokens.to(device),
+            text_tokens_lens.to(device),
+            audio_prompts,
+            enroll_x_lens=enroll_x_lens,
+            top_k=top_k,
+            temperature=temperature,
+        )
+
+
+def decode_frames(encoded_frames, audio_tokenizer, mbd):
+    if mbd:
+        samples = audio_tokenizer.mbd_decode(encoded_frames.transpose(2, 1))
+    else:
+        samples = audio_tokenizer.decode([(encoded_frames.transpose(2, 1), None)])
+
+    return samples[0].cpu().detach()
+
+
+def decode_frames_batch(frames_list, audio_tokenizer, mbd):
+    if len(frames_list) == 1:
+        return [decode_frames(frames_list[0], audio_tokenizer, mbd)]
+
+    lengths = [encoded_frames.shape[1] for encoded_frames in frames_list]
+
+    if mbd:
+        # The MBD diffusion model is not causal, padding would condition the
+        # tail of every shorter item. Only items of equal length share a call.
+        waveforms = [None] * len(frames_list)
+        groups = {}
+        for i, length in enumerate(lengths):
+            groups.setdefault(length, []).append(i)
+        for indices in groups.values():
+            if len(indices) == 1:
+                waveforms[indices[0]] = decode_frames(frames_list[indices[0]], audio_tokenizer, mbd)
+                continue
+            frames = torch.cat([frames_list[i] for i in indices], dim=0).transpose(2, 1)
+            for i, sample in zip(indices, audio_tokenizer.mbd_decode_batch(frames)):
+                waveforms[i] = sample[0].cpu().detach()
+        return waveforms
+
+    # Right-pad every item to the longest by repeating its last frame, EnCodec
+    # is causal so the padded tail is trimmed off again after decoding
+    max_len = max(lengths)
+    padded = torch.cat(
+        [
+            torch.cat([f, f[:, -1:].expand(-1, max_len - f.shape[1], -1)], dim=1)
+            for f in frames_list
+        ],
+        dim=0,
+    ).transpose(2, 1)
+
+    samples = audio_tokenizer.decode([(padded, None)])
+    samples_per_frame = samples.shape[-1] // max_len
+    return [
+        samples[i, :, : length * samples_per_frame].cpu().detach()
+        for i, length in enumerate(lengths)
+    ]
+
+
+@torch.inference_mode()
 def infer_texts(
     texts_with_filenames,
     output_dir,
@@ -68,35 +191,41 @@ def infer_texts(
     top_k=50,
     temperature=1,
     args=None,
+    enroll_x_lens=None,
 ):
-    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    if output_dir is not None:
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
 
-    for filename, text in texts_with_filenames:
-        text_without_space = [replace_chars(f"{prompt_text} {text}").strip().replace(" ", "_")]
-        tokens = alef_bert_tokenizer._tokenize(text_without_space)
-        prompt_text_without_space = [replace_chars(f"{prompt_text}").strip().replace(" ", "_")]
-        prompt_tokens = alef_bert_tokenizer._tokenize(prompt_text_without_space)
+    waveforms = []
 
-        text_tokens, text_tokens_lens = text_collater([tokens])
-        _, enroll_x_lens = text_collater([prompt_tokens])
+    # The prompt is shared by every text in the batch, tokenize it only once
+    if enroll_x_lens is None:
+        enroll_x_lens = prepare_prompt(prompt_text, text_collater, alef_bert_tokenizer)
 
-        encoded_frames = model.inference(
-            text_tokens.to(device),
-            text_tokens_lens.to(device),
+    for filename, text in texts_with_filenames:
+        encoded_frames = generate_frames(
+            text,
+            prompt_text,
+            enroll_x_lens,
+            device,
+            model,
+            text_collater,
+            alef_bert_tokenizer,
             audio_prompts,
-            enroll_x_lens=enroll_x_lens,
             top_k=top_k,
             temperature=temperature,
+            quantization=getattr(args, "quantization", "none"),
         )
 
-        audio_path = Path(output_dir) / f"{filename}.wav"
+        waveform = decode_frames(encoded_frames, audio_tokenizer, args.mbd)
+        waveforms.append(waveform)
 
-        if args.mbd:
-            samples = audio_tokenizer.mbd_decode(encoded_frames.transpose(2, 1))
-        else:
-            samples = audio_tokenizer.decode([(encoded_frames.transpose(2, 1), None)])
+        # Without an output_dir the caller only wants the waveforms back
+        if output_dir is not None:
+            audio_path = Path(output_dir) / f"{filename}.wav"
+            torchaudio.save(audio_path.as_posix(), waveform, 24000)
 
-        torchaudio.save(audio_path.as_posix(), samples[0].cpu().detach(), 24000)
+    return waveforms
 
 def infer(checkpoint_path, output_dir, texts, prompt_text, prompt_audio, top_k=50, temperature=1, args=None):
 
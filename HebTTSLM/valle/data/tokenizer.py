@@ -457,6 +457,23 @@ class AudioTokenizer:
     def mbd_decode(self, frames: torch.Tensor) -> torch.Tensor:
         return self.mbd.tokens_to_wav(frames)
 
+    def mbd_decode_batch(self, frames: torch.Tensor) -> List[torch.Tensor]:
+        """Decode a (B, K, T) batch of equal-length codes with MBD.
+
+        Codec decoding and diffusion run on the whole batch, the final eq
+        matching runs per item since `re_eq` takes its statistics over the
+        entire tensor. The diffusion model is not causal, so the items must
+        not be padded.
+        """
+        wav_encodec = self.mbd.codec_model.decode(frames)
+        condition = self.mbd.get_emb(frames)
+        wav_diffusion = self.mbd.generate(emb=condition, size=wav_encodec.size())
+
+        return [
+            self.mbd.re_eq(wav=wav_diffusion[i : i + 1], ref=wav_encodec[i : i + 1])
+            for i in range(frames.shape[0])
+        ]
+
 
 
 def tokenize_audio(tokenizer: AudioTokenizer, audio_path: str):
@@ -6,18 +6,41 @@ through intelligent chunking and audio concatenation.
 """
 
 import os
+import queue
 import tempfile
+import threading
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Iterator, List, Tuple, Optional
 import torchaudio
 import torch
 
 # Import existing components
-from text_chunker import prepare_chunked_texts
-from HebTTSLM.infer import infer_texts
+from text_chunker import prepare_chunked_texts_soa
+from HebTTSLM.infer import prepare_prompt, generate_frames, decode_frames_batch
 
+# Output sample rate of the EnCodec / MBD decoders
+SAMPLE_RATE = 24000
 
+# Brief silence inserted between chunks for more natural speech
+CHUNK_SILENCE_SECONDS = 0.3
+
+
+@lru_cache(maxsize=4)
+def _get_lm_streams(device: torch.device, num_workers: int) -> Tuple[torch.cuda.Stream, ...]:
+    """Create the LM worker streams once per device and worker count and reuse them."""
+    return tuple(torch.cuda.Stream(device) for _ in range(num_workers))
+
+
+@lru_cache(maxsize=16)
+def _get_resampler(src_sr: int, dst_sr: int) -> torchaudio.transforms.Resample:
+    """Build a resampler once per (source, target) rate pair and reuse it."""
+    return torchaudio.transforms.Resample(src_sr, dst_sr)
+
+
+@torch.inference_mode()
 def concatenate_audio_files(audio_files: List[Path], output_path: Path, sample_rate: int = 24000) -> bool:
     """
     Concatenate multiple audio files into a single output file.
@@ -33,31 +56,37 @@ def concatenate_audio_files(audio_files: List[Path], output_path: Path, sample_r
     logger = logging.getLogger(__name__)
     
     try:
-        audio_tensors = []
-        
         for audio_file in audio_files:
             if not audio_file.exists():
                 logger.error(f"Audio file not found: {audio_file}")
                 return False
-            
-            # Load audio file
-            waveform, sr = torchaudio.load(audio_file)
-            
+        
+        if not audio_files:
+            logger.error("No audio tensors to concatenate")
+            return False
+        
+        # Load audio files concurrently, decoding releases the GIL.
+        # executor.map preserves input order.
+        with ThreadPoolExecutor(max_workers=min(8, len(audio_files))) as executor:
+            loaded = list(executor.map(torchaudio.load, audio_files))
+        
+        audio_tensors = []
+        
+        for audio_file, (waveform, sr) in zip(audio_files, loaded):
             # Resample if necessary
             if sr != sample_rate:
                 logger.warning(f"Resampling {audio_file} from {sr} to {sample_rate}")
-                resampler = torchaudio.transforms.Resample(sr, sample_rate)
+                resampler = _get_resampler(sr, sample_rate)
                 waveform = resampler(waveform)
             
             audio_tensors.append(waveform)
             logger.debug(f"Loaded {audio_file}: {waveform.shape}")
         
-        if not audio_tensors:
-            logger.error("No audio tensors to concatenate")
-            return False
+        # Drop the loader's references so the concatenation can free sources
+        del loaded
         
-        # Concatenate along time dimension
-        concatenated = torch.cat(audio_tensors, dim=1)
+        # Concatenate along time dimension, freeing each source once copied
+        concatenated = concatenate_waveforms(audio_tensors, release_inputs=True)
         
         # Save concatenated audio
         torchaudio.save(output_path, concatenated, sample_rate)
@@ -70,9 +99,229 @@ def concatenate_audio_files(audio_files: List[Path], output_path: Path, sample_r
         return False
 
 
-def infer_chunked_text(
+def concatenate_waveforms(
+    waveforms: List[torch.Tensor],
+    gap_samples: int = 0,
+    release_inputs: bool = False
+) -> torch.Tensor:
+    """
+    Concatenate waveforms along the time dimension.
+    
+    The output is allocated once at its final size and filled in place,
+    so no intermediate copies are made.
+    
+    Args:
+        waveforms: List of (channels, samples) tensors with matching channels
+        gap_samples: Number of silent samples inserted between waveforms
+        release_inputs: Replace each entry of `waveforms` with None once it has
+            been copied, so its memory can be freed before the copy finishes
+        
+    Returns:
+        Concatenated (channels, total_samples) tensor
+    """
+    if len(waveforms) == 1:
+        return waveforms[0]
+    
+    total_samples = sum(waveform.shape[1] for waveform in waveforms) + (len(waveforms) - 1) * gap_samples
+    concatenated = torch.empty(waveforms[0].shape[0], total_samples, dtype=waveforms[0].dtype)
+    
+    offset = 0
+    for i in range(len(waveforms)):
+        waveform = waveforms[i]
+        concatenated[:, offset:offset + waveform.shape[1]].copy_(waveform)
+        offset += waveform.shape[1]
+        
+        if release_inputs:
+            waveforms[i] = None
+        del waveform
+        
+        # Silence between chunks (but not after the last one)
+        if gap_samples and i < len(waveforms) - 1:
+            concatenated[:, offset:offset + gap_samples].zero_()
+            offset += gap_samples
+    
+    return concatenated
+
+
+@torch.inference_mode()
+def iter_chunk_waveforms(
+    texts_with_filenames: List[Tuple[str, str]],
+    prompt_text: str,
+    device,
+    model,
+    text_collater,
+    audio_tokenizer,
+    alef_bert_tokenizer,
+    audio_prompts,
+    top_k: int = 50,
+    temperature: float = 1.0,
+    args=None,
+    batch_size: int = 4,
+    enroll_x_lens=None
+) -> Iterator[Tuple[str, str, torch.Tensor]]:
+    """
+    Synthesize prepared chunks, yielding each waveform as soon as it is ready.
+    
+    Runs as a two-stage pipeline: a background thread generates the audio
+    tokens of the next mini-batch with the LM while the calling thread decodes
+    the previous one with the vocoder, in a single batched call. On GPU each
+    stage gets its own CUDA stream so the two can overlap.
+    
+    With args.num_workers > 1 the LM stage runs that many chunks concurrently,
+    each worker on its own CUDA stream. This only pays off on GPUs large enough
+    to run several small chunks side by side. The model is shared between the
+    workers: its positional encodings are pre-extended to 4000 frames, so
+    chunks shorter than that only read them, apart from a one-off move to the
+    model's device on the first call. With args.compile the LM always runs on
+    a single worker, as compiled modules are not safe to call from several
+    threads.
+    
+    Args:
+        texts_with_filenames: List of (filename, text) pairs to synthesize
+        prompt_text: Speaker prompt text
+        device: PyTorch device
+        model: TTS model
+        text_collater: Text collation function
+        audio_tokenizer: Audio tokenizer
+        alef_bert_tokenizer: Hebrew tokenizer
+        audio_prompts: Audio prompt tensors
+        top_k: Top-k sampling parameter
+        temperature: Temperature for sampling
+        args: Additional arguments, num_workers sets the number of concurrent LM workers
+        batch_size: Number of chunks handed from the LM to the vocoder at a time
+        enroll_x_lens: Precomputed prompt length from prepare_prompt, computed here if omitted
+        
+    Yields:
+        Tuples of (filename, chunk_text, waveform) in input order
+    """
+    logger = logging.getLogger(__name__)
+    total_chunks = len(texts_with_filenames)
+    use_cuda = torch.device(device).type == "cuda"
+    
+    # Chunks are generated concurrently by up to num_workers threads, each on its own CUDA stream
+    num_workers = max(1, getattr(args, "num_workers", 1) or 1)
+    if num_workers > 1 and getattr(args, "compile", False):
+        # Dynamo compilation is not thread-safe, keep the compiled decoder on one thread
+        logger.warning("num_workers is ignored with compile, generating chunks serially")
+        num_workers = 1
+    lm_streams = _get_lm_streams(torch.device(device), num_workers) if use_cuda else ()
+    lm_pool = ThreadPoolExecutor(num_workers, thread_name_prefix="chunk-lm") if num_workers > 1 else None
+    
+    prompt_x_lens = enroll_x_lens
+    if prompt_x_lens is None:
+        prompt_x_lens = prepare_prompt(prompt_text, text_collater, alef_bert_tokenizer)
+    
+    # Bounded so the LM stays at most two mini-batches ahead of the vocoder
+    frames_queue = queue.Queue(maxsize=2)
+    stop = threading.Event()
+    
+    def put(item) -> bool:
+        # Give up once the consumer has gone away instead of blocking forever
+        while not stop.is_set():
+            try:
+                frames_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def generate(index: int, chunk_text: str):
+        stream = lm_streams[index % len(lm_streams)] if use_cuda else None
+        
+        # Grad mode is thread-local, every LM thread needs its own inference mode
+        with torch.inference_mode(), torch.cuda.stream(stream):
+            encoded_frames = generate_frames(
+                chunk_text,
+                prompt_text,
+                prompt_x_lens,
+                device,
+                model,
+                text_collater,
+                alef_bert_tokenizer,
+                audio_prompts,
+                top_k=top_k,
+                temperature=temperature,
+                quantization=getattr(args, "quantization", "none")
+            )
+            
+            ready = None
+            if stream is not None:
+                ready = torch.cuda.Event()
+                ready.record(stream)
+        
+        return encoded_frames, ready
+    
+    def produce():
+        # Chunks in flight, keyed by index so they are handed on in input order
+        pending = {}
+        next_index = 0
+        
+        try:
+            for start in range(0, total_chunks, batch_size):
+                batch = texts_with_filenames[start:start + batch_size]
+                end = start + len(batch)
+                logger.info(f"Generating audio tokens for chunks {start+1}-{end}/{total_chunks}")
+                
+                # Keep every worker busy, possibly already on the following batches
+                while next_index < min(total_chunks, max(end, start + num_workers)):
+                    chunk_text = texts_with_filenames[next_index][1]
+                    if lm_pool is None:
+                        pending[next_index] = generate(next_index, chunk_text)
+                    else:
+                        pending[next_index] = lm_pool.submit(generate, next_index, chunk_text)
+                    next_index += 1
+                
+                results = [pending.pop(i) for i in range(start, end)]
+                if lm_pool is not None:
+                    results = [future.result() for future in results]
+                
+                frames = [encoded_frames for encoded_frames, _ in results]
+                events = [ready for _, ready in results]
+                
+                if not put((start, batch, frames, events)):
+                    return
+            
+            put(None)
+        except Exception as e:
+            put(e)
+    
+    producer = threading.Thread(target=produce, name="chunk-lm-producer", daemon=True)
+    producer.start()
+    
+    decode_stream = torch.cuda.Stream(device) if use_cuda else None
+    
+    try:
+        while True:
+            item = frames_queue.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            
+            start, batch, frames, events = item
+            logger.info(f"Decoding chunks {start+1}-{start+len(batch)}/{total_chunks}")
+            
+            with torch.cuda.stream(decode_stream):
+                for encoded_frames, ready in zip(frames, events):
+                    if ready is not None:
+                        decode_stream.wait_event(ready)
+                        encoded_frames.record_stream(decode_stream)
+                
+                # One vocoder call for the whole mini-batch
+                waveforms = decode_frames_batch(frames, audio_tokenizer, args.mbd)
+            
+            for i, ((filename, chunk_text), waveform) in enumerate(zip(batch, waveforms), start=start):
+                logger.info(f"Generated audio for chunk {i+1}: {waveform.shape[1]} samples")
+                yield filename, chunk_text, waveform
+    finally:
+        stop.set()
+        producer.join()
+        if lm_pool is not None:
+            lm_pool.shutdown(cancel_futures=True)
+
+
+def synthesize_chunked_text(
     text: str,
-    output_dir: str,
     prompt_text: str,
     device,
     model,
@@ -85,14 +334,15 @@ def infer_chunked_text(
     args=None,
     base_filename: str = "output",
     max_chars: int = 150,
-    add_silence_between_chunks: bool = True
-) -> Tuple[bool, Optional[Path], List[str]]:
+    add_silence_between_chunks: bool = True,
+    batch_size: int = 4,
+    enroll_x_lens=None
+) -> Tuple[Optional[torch.Tensor], List[str]]:
     """
-    Process long text through chunking and TTS inference.
+    Process long text through chunking and TTS inference, keeping the audio in memory.
     
     Args:
         text: Input text to synthesize
-        output_dir: Directory for output files
         prompt_text: Speaker prompt text
         device: PyTorch device
         model: TTS model
@@ -103,141 +353,166 @@ def infer_chunked_text(
         top_k: Top-k sampling parameter
         temperature: Temperature for sampling
         args: Additional arguments
-        base_filename: Base filename for outputs
+        base_filename: Base filename for chunk names
         max_chars: Maximum characters per chunk
         add_silence_between_chunks: Whether to add brief silence between chunks
+        batch_size: Number of chunks handed from the LM to the vocoder at a time
+        enroll_x_lens: Precomputed prompt length from prepare_prompt, computed here if omitted
         
     Returns:
-        Tuple of (success, final_audio_path, chunk_info_list)
+        Tuple of (waveform or None on failure, chunk_info_list)
     """
     logger = logging.getLogger(__name__)
-    output_path = Path(output_dir)
-    output_path.mkdir(parents=True, exist_ok=True)
     
     try:
         # Prepare chunked texts
         logger.info(f"Starting chunked inference for text of {len(text)} characters")
         logger.debug(f"Input text preview: {text[:100]}{'...' if len(text) > 100 else ''}")
         
-        texts_with_filenames, is_chunked = prepare_chunked_texts(
-            text, base_filename, max_chars
-        )
+        chunked = prepare_chunked_texts_soa(text, base_filename, max_chars)
         
-        logger.info(f"prepare_chunked_texts returned: {len(texts_with_filenames)} parts, is_chunked={is_chunked}")
+        logger.info(f"prepare_chunked_texts returned: {len(chunked)} parts, is_chunked={chunked.is_chunked}")
         
         # Validate that we have chunks to process
-        if not texts_with_filenames:
+        if not chunked.texts:
             logger.error("No text chunks were prepared for processing")
-            return False, None, []
+            return None, []
         
         # Log chunk details for debugging
-        for i, (filename, chunk_text) in enumerate(texts_with_filenames):
+        for i, (filename, chunk_text) in enumerate(zip(chunked.filenames, chunked.texts)):
             logger.info(f"Chunk {i+1}: {filename} - {len(chunk_text)} chars")
             logger.debug(f"Chunk {i+1} text: {chunk_text[:50]}{'...' if len(chunk_text) > 50 else ''}")
         
-        # Process each chunk
-        chunk_audio_files = []
+        waveforms = []
         chunk_info = []
         
-        for i, (filename, chunk_text) in enumerate(texts_with_filenames):
-            logger.info(f"Processing chunk {i+1}/{len(texts_with_filenames)}: {filename}")
-            logger.debug(f"Chunk text ({len(chunk_text)} chars): {chunk_text[:100]}{'...' if len(chunk_text) > 100 else ''}")
-            
-            try:
-                # Process single chunk
-                infer_texts(
-                    texts_with_filenames=[(filename, chunk_text)],
-                    output_dir=str(output_path),
-                    prompt_text=prompt_text,
-                    device=device,
-                    model=model,
-                    text_collater=text_collater,
-                    audio_tokenizer=audio_tokenizer,
-                    alef_bert_tokenizer=alef_bert_tokenizer,
-                    audio_prompts=audio_prompts,
-                    top_k=top_k,
-                    temperature=temperature,
-                    args=args
-                )
-                
-                # Check if audio file was created
-                chunk_audio_path = output_path / f"{filename}.wav"
-                if chunk_audio_path.exists():
-                    chunk_audio_files.append(chunk_audio_path)
-                    chunk_info.append(f"{filename}: {len(chunk_text)} chars")
-                    logger.info(f"Generated audio for chunk {i+1}: {chunk_audio_path}")
-                else:
-                    logger.error(f"Failed to generate audio for chunk {i+1}: {filename} - output file not created")
-                    # Add debug info about directory contents
-                    logger.debug(f"Output directory contents: {list(output_path.glob('*'))}")
-                    return False, None, chunk_info
-                    
-            except Exception as chunk_error:
-                logger.error(f"Exception while processing chunk {i+1}: {chunk_error}")
-                import traceback
-                logger.error(traceback.format_exc())
-                return False, None, chunk_info
-        
-        # If only one chunk, return it directly
-        if len(chunk_audio_files) == 1:
-            final_path = output_path / f"{base_filename}.wav"
-            if chunk_audio_files[0] != final_path:
-                # Rename single chunk to final filename
-                chunk_audio_files[0].rename(final_path)
-            return True, final_path, chunk_info
-        
-        # Multiple chunks - concatenate them
-        if len(chunk_audio_files) > 1:
-            logger.info(f"Concatenating {len(chunk_audio_files)} audio files")
+        try:
+            for filename, chunk_text, waveform in iter_chunk_waveforms(
+                chunked.pairs(),
+                prompt_text=prompt_text,
+                device=device,
+                model=model,
+                text_collater=text_collater,
+                audio_tokenizer=audio_tokenizer,
+                alef_bert_tokenizer=alef_bert_tokenizer,
+                audio_prompts=audio_prompts,
+                top_k=top_k,
+                temperature=temperature,
+                args=args,
+                batch_size=batch_size,
+                enroll_x_lens=enroll_x_lens
+            ):
+                waveforms.append(waveform)
+                chunk_info.append(f"{filename}: {len(chunk_text)} chars")
+        except Exception as chunk_error:
+            logger.error(f"Exception while processing chunk {len(chunk_info)+1}: {chunk_error}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return None, chunk_info
+        
+        if not waveforms:
+            logger.error("No audio was generated")
+            return None, chunk_info
+        
+        # Multiple chunks - concatenate them in memory
+        gap_samples = 0
+        if len(waveforms) > 1:
+            logger.info(f"Concatenating {len(waveforms)} audio chunks")
             
             if add_silence_between_chunks:
                 # Add brief silence between chunks for more natural speech
                 logger.debug("Adding silence between chunks")
-                extended_audio_files = []
-                silence_duration = 0.3  # 300ms silence
-                sample_rate = 24000
-                
-                for i, audio_file in enumerate(chunk_audio_files):
-                    extended_audio_files.append(audio_file)
-                    
-                    # Add silence between chunks (but not after the last one)
-                    if i < len(chunk_audio_files) - 1:
-                        # Create temporary silence file
-                        silence_samples = int(silence_duration * sample_rate)
-                        silence_tensor = torch.zeros(1, silence_samples)
-                        silence_path = output_path / f"silence_{i}.wav"
-                        torchaudio.save(silence_path, silence_tensor, sample_rate)
-                        extended_audio_files.append(silence_path)
-                
-                chunk_audio_files = extended_audio_files
-            
-            # Concatenate all audio files
-            final_audio_path = output_path / f"{base_filename}.wav"
-            success = concatenate_audio_files(chunk_audio_files, final_audio_path)
-            
-            if success:
-                # Clean up chunk files and silence files
-                for audio_file in chunk_audio_files:
-                    if audio_file.name.startswith(base_filename) or audio_file.name.startswith("silence_"):
-                        try:
-                            audio_file.unlink()
-                        except:
-                            pass  # Ignore cleanup errors
-                
-                logger.info(f"Successfully created concatenated audio: {final_audio_path}")
-                return True, final_audio_path, chunk_info
-            else:
-                logger.error("Failed to concatenate audio files")
-                return False, None, chunk_info
+                gap_samples = int(CHUNK_SILENCE_SECONDS * SAMPLE_RATE)
         
-        logger.error("No audio files were generated")
-        return False, None, chunk_info
+        return concatenate_waveforms(waveforms, gap_samples, release_inputs=True), chunk_info
         
     except Exception as e:
         logger.error(f"Error in chunked inference: {e}")
         import traceback
         logger.error(traceback.format_exc())
-        return False, None, []
+        return None, []
+
+
+def infer_chunked_text(
+    text: str,
+    output_dir: str,
+    prompt_text: str,
+    device,
+    model,
+    text_collater,
+    audio_tokenizer,
+    alef_bert_tokenizer,
+    audio_prompts,
+    top_k: int = 50,
+    temperature: float = 1.0,
+    args=None,
+    base_filename: str = "output",
+    max_chars: int = 150,
+    add_silence_between_chunks: bool = True,
+    batch_size: int = 4,
+    enroll_x_lens=None
+) -> Tuple[bool, Optional[Path], List[str]]:
+    """
+    Process long text through chunking and TTS inference and write the result to disk.
+    
+    Args:
+        text: Input text to synthesize
+        output_dir: Directory for output files
+        prompt_text: Speaker prompt text
+        device: PyTorch device
+        model: TTS model
+        text_collater: Text collation function
+        audio_tokenizer: Audio tokenizer
+        alef_bert_tokenizer: Hebrew tokenizer
+        audio_prompts: Audio prompt tensors
+        top_k: Top-k sampling parameter
+        temperature: Temperature for sampling
+        args: Additional arguments
+        base_filename: Base filename for outputs
+        max_chars: Maximum characters per chunk
+        add_silence_between_chunks: Whether to add brief silence between chunks
+        batch_size: Number of chunks handed from the LM to the vocoder at a time
+        enroll_x_lens: Precomputed prompt length from prepare_prompt, computed here if omitted
+        
+    Returns:
+        Tuple of (success, final_audio_path, chunk_info_list)
+    """
+    logger = logging.getLogger(__name__)
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    
+    waveform, chunk_info = synthesize_chunked_text(
+        text=text,
+        prompt_text=prompt_text,
+        device=device,
+        model=model,
+        text_collater=text_collater,
+        audio_tokenizer=audio_tokenizer,
+        alef_bert_tokenizer=alef_bert_tokenizer,
+        audio_prompts=audio_prompts,
+        top_k=top_k,
+        temperature=temperature,
+        args=args,
+        base_filename=base_filename,
+        max_chars=max_chars,
+        add_silence_between_chunks=add_silence_between_chunks,
+        batch_size=batch_size,
+        enroll_x_lens=enroll_x_lens
+    )
+    
+    if waveform is None:
+        return False, None, chunk_info
+    
+    final_audio_path = output_path / f"{base_filename}.wav"
+    
+    try:
+        torchaudio.save(final_audio_path, waveform, SAMPLE_RATE)
+    except Exception as e:
+        logger.error(f"Error saving audio to {final_audio_path}: {e}")
+        return False, None, chunk_info
+    
+    logger.info(f"Successfully created audio: {final_audio_path}")
+    return True, final_audio_path, chunk_info
 
 
 if __name__ == "__main__":
@@ -1,27 +1,44 @@
+import io
 import os
 import sys
 import runpod
-import tempfile
-import base64
 import logging
 from pathlib import Path
 from omegaconf import OmegaConf
+import torch
+import torchaudio
+
+# pybase64 is a SIMD drop-in for the stdlib encoder, several times faster on large payloads
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
 
 # Add HebTTSLM to path
 sys.path.insert(0, str(Path(__file__).parent / "HebTTSLM"))
 
-from HebTTSLM.infer import prepare_inference, infer_texts
+from HebTTSLM.infer import prepare_inference, prepare_prompt, encode_audio_prompt, infer_texts
 from HebTTSLM.utils import AttributeDict
-from chunked_inference import infer_chunked_text
-from text_chunker import HebrewTextChunker
+from chunked_inference import synthesize_chunked_text, iter_chunk_waveforms, SAMPLE_RATE, CHUNK_SILENCE_SECONDS
+from text_chunker import get_chunker, prepare_chunked_texts
 
 # Global variables for model (loaded once at startup)
 model_components = None
 speakers_config = None
+speakers_dir = None
+
+# Encoded prompts per speaker, built on first use and bounded by speakers.yaml
+_speaker_cache = {}
+
+# Output formats a client can request and their file extensions, wav is the default
+OUTPUT_FORMATS = {"wav": "wav", "pcm16": "pcm"}
+
+# Stream each chunk's audio as soon as it is ready instead of one response per job
+STREAM_OUTPUT = os.environ.get("HEBTTS_STREAM_OUTPUT", "false").lower() in ("1", "true", "yes")
 
 def load_model():
     """Load the HebTTS model once at container startup"""
-    global model_components, speakers_config
+    global model_components, speakers_config, speakers_dir
     
     print("Loading HebTTS model...")
     
@@ -34,19 +51,23 @@ def load_model():
     
     # Load speakers config
     speakers_config = OmegaConf.load(speakers_yaml_path)
+    speakers_dir = speakers_yaml_path.parent
     
     # Create args
     args = AttributeDict({
         'tokens_file': str(hebtts_dir / "tokenizer" / "unique_words_tokens_all.k2symbols"),
         'vocab_file': str(hebtts_dir / "tokenizer" / "vocab.txt"),
         'mbd': True,
-        'text_tokens_path': str(hebtts_dir / "tokenizer" / "unique_words_tokens_all.k2symbols")
+        'text_tokens_path': str(hebtts_dir / "tokenizer" / "unique_words_tokens_all.k2symbols"),
+        'compile': os.environ.get("HEBTTS_COMPILE", "false").lower() in ("1", "true", "yes"),
+        'quantization': os.environ.get("HEBTTS_QUANTIZATION", "none"),
+        'num_workers': int(os.environ.get("HEBTTS_NUM_WORKERS", "1"))
     })
     
     # Use default speaker for initial model load
     default_speaker = "osim"
     speaker_info = speakers_config[default_speaker]
-    audio_prompt_path = hebtts_dir / "speakers" / speaker_info["audio-prompt"]
+    audio_prompt_path = speakers_dir / speaker_info["audio-prompt"]
     
     # Prepare inference
     device, model, text_collater, audio_tokenizer, alef_bert_tokenizer, audio_prompts = prepare_inference(
@@ -59,12 +80,120 @@ def load_model():
         'text_collater': text_collater,
         'audio_tokenizer': audio_tokenizer,
         'alef_bert_tokenizer': alef_bert_tokenizer,
-        'audio_prompts': audio_prompts,
         'args': args
     }
     
+    # The default speaker's audio prompt was already encoded by prepare_inference
+    _speaker_cache[default_speaker] = _build_speaker_artifacts(default_speaker, audio_prompts)
+    
     print("Model loaded successfully!")
 
+def _build_speaker_artifacts(speaker, audio_prompts=None):
+    """Encode a speaker's audio and text prompts, ready to be reused by every request"""
+    speaker_info = speakers_config[speaker]
+    prompt_text = speaker_info["text-prompt"]
+    
+    if audio_prompts is None:
+        audio_prompts = encode_audio_prompt(
+            str(speakers_dir / speaker_info["audio-prompt"]),
+            model_components['audio_tokenizer'],
+            model_components['device']
+        )
+    
+    return {
+        'prompt_text': prompt_text,
+        'audio_prompts': audio_prompts,
+        'enroll_x_lens': prepare_prompt(
+            prompt_text,
+            model_components['text_collater'],
+            model_components['alef_bert_tokenizer']
+        )
+    }
+
+def get_speaker_artifacts(speaker):
+    """Return the cached prompts of a speaker, encoding them on first use"""
+    if speaker not in _speaker_cache:
+        print(f"Encoding prompts for speaker {speaker}")
+        _speaker_cache[speaker] = _build_speaker_artifacts(speaker)
+    return _speaker_cache[speaker]
+
+def validate_job_input(job_input):
+    """Return an error response if the job input is invalid, None otherwise"""
+    if "text" not in job_input or "speaker" not in job_input:
+        return {"error": "Missing required fields: text and speaker"}
+    
+    if not job_input["text"].strip():
+        return {"error": "Text cannot be empty"}
+    
+    if job_input["speaker"] not in speakers_config:
+        return {
+            "error": f"Invalid speaker: {job_input['speaker']}",
+            "available_speakers": list(speakers_config.keys())
+        }
+    
+    if job_input.get("format", "wav") not in OUTPUT_FORMATS:
+        return {
+            "error": f"Invalid format: {job_input['format']}",
+            "available_formats": list(OUTPUT_FORMATS)
+        }
+    
+    return None
+
+def parse_job_settings(job_input):
+    """Read the optional job parameters shared by both handlers, applying their defaults"""
+    text = job_input["text"]
+    max_chunk_chars = job_input.get("max_chunk_chars", 150)
+    output_format = job_input.get("format", "wav")
+    
+    # Create custom args with user's MBD preference
+    custom_args = AttributeDict(model_components['args'])
+    custom_args.mbd = job_input.get("use_mbd", True)
+    
+    # Check if chunking is needed and enabled
+    chunker = get_chunker(max_chunk_chars)
+    should_chunk = job_input.get("enable_chunking", True) and not chunker.is_chunk_valid(text)
+    
+    return AttributeDict({
+        'text': text,
+        'speaker': job_input["speaker"],
+        'top_k': job_input.get("top_k", 50),
+        'temperature': job_input.get("temperature", 1.0),
+        'filename': job_input.get("filename", "output"),
+        'max_chunk_chars': max_chunk_chars,
+        'output_format': output_format,
+        'extension': OUTPUT_FORMATS[output_format],
+        'custom_args': custom_args,
+        'should_chunk': should_chunk
+    })
+
+def encode_base64(data):
+    """Base64-encode raw bytes into an ASCII string"""
+    return base64.b64encode(data).decode('ascii')
+
+def encode_wav_base64(waveform):
+    """Encode a waveform as a base64 WAV string"""
+    buffer = io.BytesIO()
+    torchaudio.save(buffer, waveform, SAMPLE_RATE, format="wav")
+    return encode_base64(buffer.getvalue())
+
+def encode_audio(waveform, output_format):
+    """Encode a waveform in the requested output format, returning the response fields"""
+    if output_format == "pcm16":
+        # Raw little-endian int16 samples, half the size of the float32 WAV
+        pcm = (waveform.clamp(-1, 1) * 32767).to(torch.int16).contiguous()
+        return {
+            "pcm_base64": encode_base64(pcm.numpy().astype('<i2', copy=False).tobytes()),
+            "format": "pcm16",
+            "dtype": "int16",
+            "channels": 1
+        }
+    
+    return {
+        "audio_base64": encode_wav_base64(waveform),
+        "format": "wav"
+    }
+
+@torch.inference_mode()
 def handler(job):
     """
     RunPod serverless handler function.
@@ -79,161 +208,200 @@ def handler(job):
             "use_mbd": true,
             "filename": "output",
             "enable_chunking": true,
-            "max_chunk_chars": 150
+            "max_chunk_chars": 150,
+            "format": "wav"
         }
     }
+    
+    "format" is "wav" (base64 WAV in audio_base64) or "pcm16" (base64 raw
+    int16 samples in pcm_base64, plus dtype and channels).
     """
     try:
         job_input = job["input"]
         
-        # Validate required fields
-        if "text" not in job_input or "speaker" not in job_input:
-            return {"error": "Missing required fields: text and speaker"}
-        
-        text = job_input["text"]
-        speaker = job_input["speaker"]
-        
-        # Optional parameters with defaults
-        top_k = job_input.get("top_k", 50)
-        temperature = job_input.get("temperature", 1.0)
-        use_mbd = job_input.get("use_mbd", True)
-        filename = job_input.get("filename", "output")
-        enable_chunking = job_input.get("enable_chunking", True)
-        max_chunk_chars = job_input.get("max_chunk_chars", 150)
-        
         # Validate inputs
-        if not text.strip():
-            return {"error": "Text cannot be empty"}
+        error = validate_job_input(job_input)
+        if error:
+            return error
         
-        if speaker not in speakers_config:
-            return {
-                "error": f"Invalid speaker: {speaker}",
-                "available_speakers": list(speakers_config.keys())
-            }
+        settings = parse_job_settings(job_input)
+        text = settings.text
+        filename = settings.filename
+        max_chunk_chars = settings.max_chunk_chars
+        output_format = settings.output_format
         
-        # Get speaker info
-        speaker_info = speakers_config[speaker]
-        prompt_text = speaker_info["text-prompt"]
+        # Get speaker prompts
+        speaker_artifacts = get_speaker_artifacts(settings.speaker)
+        prompt_text = speaker_artifacts['prompt_text']
         
-        # Create temp directory for output
-        with tempfile.TemporaryDirectory() as temp_dir:
-            output_dir = Path(temp_dir)
+        # Audio is kept in memory and encoded straight from the waveform
+        if settings.should_chunk:
+            print(f"Text is {len(text)} characters, using chunking with max {max_chunk_chars} chars per chunk")
             
-            # Create custom args with user's MBD preference
-            custom_args = AttributeDict(model_components['args'])
-            custom_args.mbd = use_mbd
+            # Use chunked inference
+            waveform, chunk_info = synthesize_chunked_text(
+                text=text,
+                prompt_text=prompt_text,
+                device=model_components['device'],
+                model=model_components['model'],
+                text_collater=model_components['text_collater'],
+                audio_tokenizer=model_components['audio_tokenizer'],
+                alef_bert_tokenizer=model_components['alef_bert_tokenizer'],
+                audio_prompts=speaker_artifacts['audio_prompts'],
+                top_k=settings.top_k,
+                temperature=settings.temperature,
+                args=settings.custom_args,
+                enroll_x_lens=speaker_artifacts['enroll_x_lens'],
+                base_filename=filename,
+                max_chars=max_chunk_chars
+            )
             
-            # Check if chunking is needed and enabled
-            chunker = HebrewTextChunker(max_chunk_chars)
-            should_chunk = enable_chunking and not chunker.is_chunk_valid(text)
-            
-            if should_chunk:
-                print(f"Text is {len(text)} characters, using chunking with max {max_chunk_chars} chars per chunk")
-                
-                # Use chunked inference
-                success, audio_file_path, chunk_info = infer_chunked_text(
-                    text=text,
-                    output_dir=str(output_dir),
-                    prompt_text=prompt_text,
-                    device=model_components['device'],
-                    model=model_components['model'],
-                    text_collater=model_components['text_collater'],
-                    audio_tokenizer=model_components['audio_tokenizer'],
-                    alef_bert_tokenizer=model_components['alef_bert_tokenizer'],
-                    audio_prompts=model_components['audio_prompts'],
-                    top_k=top_k,
-                    temperature=temperature,
-                    args=custom_args,
-                    base_filename=filename,
-                    max_chars=max_chunk_chars
-                )
-                
-                if not success or not audio_file_path or not audio_file_path.exists():
-                    error_details = {
-                        "error": "Chunked audio generation failed",
-                        "chunk_info": chunk_info,
-                        "debug_info": {
-                            "success": success,
-                            "audio_file_path_exists": audio_file_path.exists() if audio_file_path else False,
-                            "audio_file_path": str(audio_file_path) if audio_file_path else None,
-                            "chunks_attempted": len(chunk_info),
-                            "text_length": len(text),
-                            "max_chunk_chars": max_chunk_chars
-                        }
-                    }
-                    print(f"Chunked generation failed: {error_details}")
-                    return error_details
-                
-                # Read generated audio
-                with open(audio_file_path, 'rb') as f:
-                    audio_data = f.read()
-                
-                audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-                
-                # Return audio with chunking info
-                return {
-                    "audio_base64": audio_base64,
-                    "filename": f"{filename}.wav",
-                    "sample_rate": 24000,
-                    "format": "wav",
-                    "chunked": True,
+            if waveform is None:
+                error_details = {
+                    "error": "Chunked audio generation failed",
                     "chunk_info": chunk_info,
-                    "original_length": len(text),
-                    "chunks_processed": len(chunk_info)
-                }
-            else:
-                print(f"Text is {len(text)} characters, processing as single chunk")
-                
-                # Use standard inference for short texts
-                texts_with_filenames = [(filename, text)]
-                
-                infer_texts(
-                    texts_with_filenames=texts_with_filenames,
-                    output_dir=str(output_dir),
-                    prompt_text=prompt_text,
-                    device=model_components['device'],
-                    model=model_components['model'],
-                    text_collater=model_components['text_collater'],
-                    audio_tokenizer=model_components['audio_tokenizer'],
-                    alef_bert_tokenizer=model_components['alef_bert_tokenizer'],
-                    audio_prompts=model_components['audio_prompts'],
-                    top_k=top_k,
-                    temperature=temperature,
-                    args=custom_args
-                )
-                
-                # Read generated audio
-                audio_file_path = output_dir / f"{filename}.wav"
-                
-                if not audio_file_path.exists():
-                    return {"error": "Audio generation failed"}
-                
-                # Read audio file as base64
-                with open(audio_file_path, 'rb') as f:
-                    audio_data = f.read()
-                
-                audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-                
-                # Return audio as base64 in output
-                return {
-                    "audio_base64": audio_base64,
-                    "filename": f"{filename}.wav",
-                    "sample_rate": 24000,
-                    "format": "wav",
-                    "chunked": False,
-                    "original_length": len(text)
+                    "debug_info": {
+                        "chunks_attempted": len(chunk_info),
+                        "text_length": len(text),
+                        "max_chunk_chars": max_chunk_chars
+                    }
                 }
+                print(f"Chunked generation failed: {error_details}")
+                return error_details
             
+            # Return audio with chunking info
+            return {
+                **encode_audio(waveform, output_format),
+                "filename": f"{filename}.{settings.extension}",
+                "sample_rate": SAMPLE_RATE,
+                "chunked": True,
+                "chunk_info": chunk_info,
+                "original_length": len(text),
+                "chunks_processed": len(chunk_info)
+            }
+        
+        print(f"Text is {len(text)} characters, processing as single chunk")
+        
+        # Short texts are synthesized in a single call, one waveform per text
+        waveforms = infer_texts(
+            texts_with_filenames=[(filename, text)],
+            output_dir=None,
+            prompt_text=prompt_text,
+            device=model_components['device'],
+            model=model_components['model'],
+            text_collater=model_components['text_collater'],
+            audio_tokenizer=model_components['audio_tokenizer'],
+            alef_bert_tokenizer=model_components['alef_bert_tokenizer'],
+            audio_prompts=speaker_artifacts['audio_prompts'],
+            top_k=settings.top_k,
+            temperature=settings.temperature,
+            args=settings.custom_args,
+            enroll_x_lens=speaker_artifacts['enroll_x_lens']
+        )
+        
+        # Return audio as base64 in output
+        return {
+            **encode_audio(waveforms[0], output_format),
+            "filename": f"{filename}.{settings.extension}",
+            "sample_rate": SAMPLE_RATE,
+            "chunked": False,
+            "original_length": len(text)
+        }
+        
     except Exception as e:
         print(f"Error in handler: {str(e)}")
         import traceback
         traceback.print_exc()
         return {"error": f"Processing failed: {str(e)}"}
 
+@torch.inference_mode()
+def stream_handler(job):
+    """
+    RunPod streaming handler, used when HEBTTS_STREAM_OUTPUT is enabled.
+    
+    Takes the same input as `handler`, but yields every chunk's audio as soon
+    as it has been synthesized instead of waiting for the whole text:
+    {
+        "audio_base64": "...",
+        "index": 0,
+        "total_chunks": 3,
+        "filename": "output_part_001_of_003.wav",
+        "sample_rate": 24000,
+        "format": "wav"
+    }
+    
+    With "format": "pcm16" the audio is sent as pcm_base64 instead, like `handler`.
+    
+    Every chunk but the last ends with the inter-chunk silence, so clients
+    only need to concatenate the decoded chunks in index order.
+    """
+    try:
+        job_input = job["input"]
+        
+        # Validate inputs
+        error = validate_job_input(job_input)
+        if error:
+            yield error
+            return
+        
+        settings = parse_job_settings(job_input)
+        text = settings.text
+        output_format = settings.output_format
+        
+        speaker_artifacts = get_speaker_artifacts(settings.speaker)
+        prompt_text = speaker_artifacts['prompt_text']
+        
+        if settings.should_chunk:
+            texts_with_filenames, _ = prepare_chunked_texts(text, settings.filename, settings.max_chunk_chars)
+        else:
+            texts_with_filenames = [(settings.filename, text)]
+        
+        total_chunks = len(texts_with_filenames)
+        gap_samples = int(CHUNK_SILENCE_SECONDS * SAMPLE_RATE)
+        print(f"Streaming {total_chunks} chunk(s) for text of {len(text)} characters")
+        
+        # One chunk per inference call so the first chunk is sent as early as possible
+        chunks = iter_chunk_waveforms(
+            texts_with_filenames,
+            prompt_text=prompt_text,
+            device=model_components['device'],
+            model=model_components['model'],
+            text_collater=model_components['text_collater'],
+            audio_tokenizer=model_components['audio_tokenizer'],
+            alef_bert_tokenizer=model_components['alef_bert_tokenizer'],
+            audio_prompts=speaker_artifacts['audio_prompts'],
+            top_k=settings.top_k,
+            temperature=settings.temperature,
+            args=settings.custom_args,
+            batch_size=1,
+            enroll_x_lens=speaker_artifacts['enroll_x_lens']
+        )
+        
+        for index, (chunk_filename, chunk_text, waveform) in enumerate(chunks):
+            if index < total_chunks - 1:
+                waveform = torch.nn.functional.pad(waveform, (0, gap_samples))
+            
+            yield {
+                **encode_audio(waveform, output_format),
+                "index": index,
+                "total_chunks": total_chunks,
+                "filename": f"{chunk_filename}.{settings.extension}",
+                "sample_rate": SAMPLE_RATE
+            }
+            
+    except Exception as e:
+        print(f"Error in stream handler: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        yield {"error": f"Processing failed: {str(e)}"}
+
 # Load model at startup (before any jobs)
 print("Starting model load...")
 load_model()
 print("Model load complete, starting serverless worker...")
 
 # Start the serverless worker
-runpod.serverless.start({"handler": handler})
\ No newline at end of file
+if STREAM_OUTPUT:
+    runpod.serverless.start({"handler": stream_handler, "return_aggregate_stream": True})
+else:
+    runpod.serverless.start({"handler": handler})
\ No newline at end of file
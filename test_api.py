@@ -170,6 +170,31 @@ def test_integration_scenarios():
             print(f"   Chunk sizes: {[len(c) for c in chunks]}")
 
 
+def test_word_fallback_chunk_sizes():
+    """Test that text without punctuation is packed into chunks within max_chars"""
+    from text_chunker import HebrewTextChunker
+    max_chars = 150
+    chunker = HebrewTextChunker(max_chars)
+    
+    # A single clause of long words with no punctuation to split on
+    words = [f"מילהארוכהמאוד{i}" for i in range(60)]
+    text = " ".join(words)
+    chunks = chunker.chunk_text(text)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= max_chars for chunk in chunks), [len(c) for c in chunks]
+    assert " ".join(chunks).split() == words
+    
+    # A word longer than max_chars becomes a chunk of its own
+    long_word = "א" * (max_chars + 20)
+    text = " ".join(words[:5] + [long_word] + words[5:10])
+    chunks = chunker.split_by_words(text)
+    assert long_word in chunks
+    assert all(len(chunk) <= max_chars for chunk in chunks if chunk != long_word)
+    assert " ".join(chunks).split() == text.split()
+    
+    print("✓ Word fallback chunks stay within max_chars and keep every word")
+
+
 if __name__ == "__main__":
     print("Enhanced Hebrew TTS API Test Suite")
     print("Testing chunking functionality and integration")
@@ -179,6 +204,7 @@ if __name__ == "__main__":
         test_chunking_api()
         test_parameter_validation()
         test_integration_scenarios()
+        test_word_fallback_chunk_sizes()
         
         print("\n" + "=" * 60)
         print("✓ All API tests completed successfully!")
@@ -6,11 +6,37 @@ respecting model limitations while maintaining natural speech boundaries.
 """
 
 import re
+import hashlib
 import logging
-from typing import List, Tuple
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Tuple
 from pathlib import Path
 
 
+# Boundary patterns are compiled once at import and shared by every chunker
+
+# Hebrew sentence boundaries - common punctuation
+_SENT_RE = re.compile(r'[.!?״׳][\s]*')
+
+# Hebrew clause boundaries - pauses in speech
+_CLAUSE_RE = re.compile(r'[,;:–—־][\s]*')
+
+# Word boundaries for fallback
+_WS_RE = re.compile(r'\s+')
+
+# Every character the sentence and clause patterns split on
+_BOUNDARY_CHARS = ".!?״׳,;:–—־"
+
+# Estimated token budget per chunk, a safety margin under the 512 token limit
+_MAX_TOKENS = 400
+
+# Longest text whose estimate_token_count stays within _MAX_TOKENS, the largest n with 2n // 3 <= _MAX_TOKENS
+_MAX_CHARS_FOR_TOKENS = (3 * (_MAX_TOKENS + 1) + 1) // 2 - 1
+
+
 class HebrewTextChunker:
     """
     Handles chunking of Hebrew text for TTS processing.
@@ -21,6 +47,10 @@ class HebrewTextChunker:
     - Uses smart boundary detection for natural speech
     """
     
+    sentence_ends = _SENT_RE
+    clause_boundaries = _CLAUSE_RE
+    word_boundary = _WS_RE
+    
     def __init__(self, max_chars: int = 150):
         """
         Initialize the chunker.
@@ -31,14 +61,9 @@ class HebrewTextChunker:
         self.max_chars = max_chars
         self.logger = logging.getLogger(__name__)
         
-        # Hebrew sentence boundaries - common punctuation
-        self.sentence_ends = re.compile(r'[.!?״׳][\s]*')
-        
-        # Hebrew clause boundaries - pauses in speech
-        self.clause_boundaries = re.compile(r'[,;:–—־][\s]*')
-        
-        # Word boundaries for fallback
-        self.word_boundary = re.compile(r'\s+')
+        # The token estimate only depends on the length, so the token budget is
+        # folded into the character limit once instead of checked per chunk
+        self._effective_max = min(max_chars, _MAX_CHARS_FOR_TOKENS)
     
     def estimate_token_count(self, text: str) -> int:
         """
@@ -51,8 +76,9 @@ class HebrewTextChunker:
             Estimated number of tokens (conservative estimate)
         """
         # Conservative estimation: Hebrew averages ~2 characters per token
-        # but we use 1.5 to be safe with the 512 token limit
-        return int(len(text) / 1.5)
+        # but we use 1.5 to be safe with the 512 token limit.
+        # len / 1.5 in integer arithmetic, equal to int(len / 1.5) for every length
+        return (len(text) * 2) // 3
     
     def split_by_sentences(self, text: str) -> List[str]:
         """
@@ -64,15 +90,8 @@ class HebrewTextChunker:
         Returns:
             List of sentences with preserved punctuation
         """
-        # Split while preserving the delimiters
-        parts = self.sentence_ends.split(text)
-        sentences = []
-        
-        for i, part in enumerate(parts):
-            if part.strip():
-                sentences.append(part.strip())
-        
-        return sentences
+        # Strip every part once and drop the empty ones, all without a Python-level loop
+        return list(filter(None, map(str.strip, _SENT_RE.split(text))))
     
     def split_by_clauses(self, text: str) -> List[str]:
         """
@@ -84,36 +103,87 @@ class HebrewTextChunker:
         Returns:
             List of clauses with preserved punctuation
         """
-        parts = self.clause_boundaries.split(text)
-        clauses = []
-        
-        for part in parts:
-            if part.strip():
-                clauses.append(part.strip())
-                
-        return clauses
+        return list(filter(None, map(str.strip, _CLAUSE_RE.split(text))))
     
-    def split_by_words(self, text: str, max_words: int = 20) -> List[str]:
+    def split_by_words(self, text: str, max_words: Optional[int] = None) -> List[str]:
         """
         Split text by word boundaries as final fallback.
         
+        Words are packed greedily into chunks of at most max_chars characters,
+        a single word longer than that becomes a chunk of its own.
+        
         Args:
             text: Input text
-            max_words: Maximum words per chunk
+            max_words: Ignored, kept for backward compatibility
             
         Returns:
             List of word chunks
         """
-        words = self.word_boundary.split(text.strip())
+        max_chars = self.max_chars
         chunks = []
+        current_words = []
+        current_len = -1
+        
+        # str.split() splits on the same whitespace as _WS_RE and drops the
+        # leading and trailing runs, so every word is already stripped
+        for word in text.split():
+            new_len = current_len + 1 + len(word)
+            if new_len <= max_chars:
+                current_words.append(word)
+                current_len = new_len
+            else:
+                if current_words:
+                    chunks.append(" ".join(current_words))
+                current_words = [word]
+                current_len = len(word)
+        
+        if current_words:
+            chunks.append(" ".join(current_words))
         
-        for i in range(0, len(words), max_words):
-            chunk = " ".join(words[i:i + max_words])
-            if chunk.strip():
-                chunks.append(chunk.strip())
-                
         return chunks
     
+    def split_into_pieces(self, text: str) -> List[Tuple[str, bool]]:
+        """
+        Split text into the pieces that chunks are packed from.
+        
+        Sentences are kept whole when they fit, sentences that are too long are
+        split by clauses and clauses that are still too long by words.
+        
+        Args:
+            text: Input text
+            
+        Returns:
+            List of (piece, starts_chunk) pairs, starts_chunk is set on the first
+            piece of a split sentence, which must not be joined to what precedes it
+        """
+        max_chars = self.max_chars
+        
+        # A long text without any punctuation is a single sentence and clause,
+        # go straight to the word split. Each `in` is a C-level substring scan,
+        # far cheaper than running both boundary patterns over the text.
+        text = text.strip()
+        if len(text) > max_chars and not any(c in text for c in _BOUNDARY_CHARS):
+            return [(word_chunk, i == 0) for i, word_chunk in enumerate(self.split_by_words(text))]
+        
+        pieces = []
+        
+        for sentence in self.split_by_sentences(text):
+            if len(sentence) <= max_chars:
+                pieces.append((sentence, False))
+                continue
+            
+            starts_chunk = True
+            for clause in self.split_by_clauses(sentence):
+                if len(clause) <= max_chars:
+                    pieces.append((clause, starts_chunk))
+                else:
+                    for word_chunk in self.split_by_words(clause):
+                        pieces.append((word_chunk, starts_chunk))
+                        starts_chunk = False
+                starts_chunk = False
+        
+        return pieces
+    
     def is_chunk_valid(self, text: str) -> bool:
         """
         Check if a text chunk is valid for processing.
@@ -124,9 +194,7 @@ class HebrewTextChunker:
         Returns:
             True if chunk is valid, False otherwise
         """
-        return (len(text.strip()) > 0 and 
-                len(text) <= self.max_chars and 
-                self.estimate_token_count(text) <= 400)  # Safety margin under 512
+        return len(text) <= self._effective_max and bool(text) and not text.isspace()
     
     def chunk_text(self, text: str) -> List[str]:
         """
@@ -142,70 +210,45 @@ class HebrewTextChunker:
         if not text:
             return []
         
-        self.logger.info(f"Chunking text of {len(text)} characters")
-        
-        # If text is already valid, return as is
-        if self.is_chunk_valid(text):
+        # Fast path: a stripped, non-empty text within the limit is already a valid chunk
+        if len(text) <= self._effective_max:
             return [text]
         
+        self.logger.info("Chunking text of %d characters", len(text))
+        
         chunks = []
+        max_chars = self.max_chars
+        
+        # The current chunk is kept as its parts plus their joined length and
+        # only joined into a string when it is flushed. Every part is already
+        # stripped by the split helpers. The length starts at -1 so adding
+        # a part always costs one separating space.
+        current_parts = []
+        current_len = -1
         
-        # Strategy 1: Split by sentences
-        sentences = self.split_by_sentences(text)
-        current_chunk = ""
-        
-        for sentence in sentences:
-            # If single sentence is too long, split it further
-            if len(sentence) > self.max_chars:
-                # Save current chunk if exists
-                if current_chunk.strip():
-                    chunks.append(current_chunk.strip())
-                    current_chunk = ""
-                
-                # Strategy 2: Split long sentence by clauses
-                clauses = self.split_by_clauses(sentence)
-                
-                for clause in clauses:
-                    # If clause is still too long, split by words
-                    if len(clause) > self.max_chars:
-                        word_chunks = self.split_by_words(clause)
-                        
-                        for word_chunk in word_chunks:
-                            if current_chunk and len(current_chunk + " " + word_chunk) > self.max_chars:
-                                chunks.append(current_chunk.strip())
-                                current_chunk = word_chunk
-                            else:
-                                current_chunk = (current_chunk + " " + word_chunk).strip()
-                    else:
-                        # Check if we can add clause to current chunk
-                        potential_chunk = (current_chunk + " " + clause).strip()
-                        if len(potential_chunk) <= self.max_chars:
-                            current_chunk = potential_chunk
-                        else:
-                            if current_chunk.strip():
-                                chunks.append(current_chunk.strip())
-                            current_chunk = clause
+        for piece, starts_chunk in self.split_into_pieces(text):
+            new_len = current_len + 1 + len(piece)
+            if new_len <= max_chars and not starts_chunk:
+                current_parts.append(piece)
+                current_len = new_len
             else:
-                # Try to add sentence to current chunk
-                potential_chunk = (current_chunk + " " + sentence).strip()
-                if len(potential_chunk) <= self.max_chars:
-                    current_chunk = potential_chunk
-                else:
-                    # Save current chunk and start new one
-                    if current_chunk.strip():
-                        chunks.append(current_chunk.strip())
-                    current_chunk = sentence
+                # Save current chunk and start new one
+                if current_parts:
+                    chunks.append(" ".join(current_parts))
+                current_parts = [piece]
+                current_len = len(piece)
         
         # Add final chunk
-        if current_chunk.strip():
-            chunks.append(current_chunk.strip())
+        if current_parts:
+            chunks.append(" ".join(current_parts))
         
         # Filter and validate chunks
         valid_chunks = [chunk for chunk in chunks if chunk.strip()]
         
-        self.logger.info(f"Split into {len(valid_chunks)} chunks")
-        for i, chunk in enumerate(valid_chunks):
-            self.logger.debug(f"Chunk {i+1}: {len(chunk)} chars, ~{self.estimate_token_count(chunk)} tokens")
+        self.logger.info("Split into %d chunks", len(valid_chunks))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            for i, chunk in enumerate(valid_chunks):
+                self.logger.debug("Chunk %d: %d chars, ~%d tokens", i + 1, len(chunk), self.estimate_token_count(chunk))
         
         # If no valid chunks were created, return the original text as a single chunk
         if not valid_chunks and text.strip():
@@ -215,9 +258,73 @@ class HebrewTextChunker:
         return valid_chunks
 
 
-def prepare_chunked_texts(text: str, base_filename: str = "output", max_chars: int = 150) -> Tuple[List[Tuple[str, str]], bool]:
+@lru_cache(maxsize=32)
+def get_chunker(max_chars: int = 150) -> HebrewTextChunker:
     """
-    Prepare text chunks with filenames for TTS processing.
+    Return a shared chunker for the given limit.
+    
+    Chunkers hold no per-text state, so one instance per max_chars is reused
+    across requests instead of building a new one every time.
+    """
+    return HebrewTextChunker(max_chars)
+
+
+# Chunks of recently seen texts, keyed by a digest of the text. The chunks themselves add up to
+# about the text's length, so the cache is bounded by total characters as well as entries, and
+# texts above a quarter of that budget are not cached at all
+_CHUNK_CACHE_SIZE = 1024
+_CHUNK_CACHE_MAX_CHARS = 4_000_000
+_CHUNK_CACHE_MAX_TEXT_CHARS = _CHUNK_CACHE_MAX_CHARS // 4
+_chunk_cache = OrderedDict()
+_chunk_cache_chars = 0
+_chunk_cache_lock = threading.Lock()
+
+def _chunk_cached(text: str, max_chars: int) -> List[str]:
+    """Chunk text with the shared chunker, reusing the result for recently seen texts."""
+    global _chunk_cache_chars
+    if len(text) > _CHUNK_CACHE_MAX_TEXT_CHARS:
+        return get_chunker(max_chars).chunk_text(text)
+    key = (hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest(), max_chars)
+    with _chunk_cache_lock:
+        entry = _chunk_cache.get(key)
+        if entry is not None:
+            _chunk_cache.move_to_end(key)
+            return list(entry[0])
+    chunks = tuple(get_chunker(max_chars).chunk_text(text))
+    size = sum(map(len, chunks))
+    with _chunk_cache_lock:
+        previous = _chunk_cache.pop(key, None)
+        if previous is not None:
+            _chunk_cache_chars -= previous[1]
+        _chunk_cache[key] = (chunks, size)
+        _chunk_cache_chars += size
+        while len(_chunk_cache) > _CHUNK_CACHE_SIZE or _chunk_cache_chars > _CHUNK_CACHE_MAX_CHARS:
+            _chunk_cache_chars -= _chunk_cache.popitem(last=False)[1][1]
+    return list(chunks)
+
+
+@dataclass
+class ChunkedTexts:
+    """
+    Chunks of a text as parallel lists, filenames[i] names the audio of texts[i].
+    
+    Consumers that batch chunks can slice texts directly without unzipping pairs.
+    """
+    filenames: List[str]
+    texts: List[str]
+    is_chunked: bool
+    
+    def __len__(self) -> int:
+        return len(self.texts)
+    
+    def pairs(self) -> List[Tuple[str, str]]:
+        """Return the chunks as (filename, text) pairs"""
+        return list(zip(self.filenames, self.texts))
+
+
+def prepare_chunked_texts_soa(text: str, base_filename: str = "output", max_chars: int = 150) -> ChunkedTexts:
+    """
+    Prepare text chunks with filenames for TTS processing, as parallel lists.
     
     Args:
         text: Input text to process
@@ -225,44 +332,107 @@ def prepare_chunked_texts(text: str, base_filename: str = "output", max_chars: i
         max_chars: Maximum characters per chunk
         
     Returns:
-        Tuple of (list of (filename, text) pairs, is_chunked_flag)
+        ChunkedTexts with the chunk filenames, chunk texts and is_chunked flag
     """
     logger = logging.getLogger(__name__)
-    logger.info(f"prepare_chunked_texts called with text_length={len(text)}, max_chars={max_chars}")
-    logger.debug(f"Input text: {text[:100]}{'...' if len(text) > 100 else ''}")
+    logger.info("prepare_chunked_texts called with text_length=%d, max_chars=%d", len(text), max_chars)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Input text: %s%s", text[:100], '...' if len(text) > 100 else '')
     
     try:
-        chunker = HebrewTextChunker(max_chars)
-        chunks = chunker.chunk_text(text)
+        # Only the chunks are cached, so any base_filename reuses them
+        chunks = _chunk_cached(text, max_chars)
         
-        logger.info(f"Chunker returned {len(chunks)} chunks")
+        logger.info("Chunker returned %d chunks", len(chunks))
         
         if len(chunks) <= 1:
             # Single chunk or no chunking needed
             result_text = chunks[0] if chunks else text
-            logger.info(f"Returning single chunk: {len(result_text)} chars")
-            return [(base_filename, result_text)], False
+            logger.info("Returning single chunk: %d chars", len(result_text))
+            return ChunkedTexts([base_filename], [result_text], False)
         else:
             # Multiple chunks - add sequence numbers
-            texts_with_filenames = []
-            for i, chunk in enumerate(chunks):
-                filename = f"{base_filename}_part_{i+1:03d}_of_{len(chunks):03d}"
-                texts_with_filenames.append((filename, chunk))
-                logger.debug(f"Chunk {i+1}: {filename} - {len(chunk)} chars")
+            filenames = [
+                f"{base_filename}_part_{i+1:03d}_of_{len(chunks):03d}"
+                for i in range(len(chunks))
+            ]
+            if logger.isEnabledFor(logging.DEBUG):
+                for i, (filename, chunk) in enumerate(zip(filenames, chunks)):
+                    logger.debug("Chunk %d: %s - %d chars", i + 1, filename, len(chunk))
             
-            logger.info(f"Returning {len(texts_with_filenames)} chunks")
-            return texts_with_filenames, True
+            logger.info("Returning %d chunks", len(chunks))
+            return ChunkedTexts(filenames, chunks, True)
             
     except Exception as e:
         logger.error(f"Error in prepare_chunked_texts: {e}")
         import traceback
         logger.error(traceback.format_exc())
         # Return original text as fallback
-        return [(base_filename, text)], False
+        return ChunkedTexts([base_filename], [text], False)
 
 
-if __name__ == "__main__":
-    # Test the chunker
+def prepare_chunked_texts(text: str, base_filename: str = "output", max_chars: int = 150) -> Tuple[List[Tuple[str, str]], bool]:
+    """
+    Prepare text chunks with filenames for TTS processing.
+    
+    Args:
+        text: Input text to process
+        base_filename: Base filename for outputs
+        max_chars: Maximum characters per chunk
+        
+    Returns:
+        Tuple of (list of (filename, text) pairs, is_chunked_flag)
+    """
+    chunked = prepare_chunked_texts_soa(text, base_filename, max_chars)
+    return chunked.pairs(), chunked.is_chunked
+
+
+def prepare_chunked_texts_batch(
+    texts: List[str],
+    base_filename: str = "output",
+    max_chars: int = 150,
+    target_batch_size: int = 4
+) -> Tuple[List[Tuple[str, str, int]], List[List[int]]]:
+    """
+    Prepare the chunks of several texts at once for batched TTS processing.
+    
+    The chunks of all texts are laid out in one flat list in input order and
+    assigned to mini-batches of target_batch_size, so the model can be fed
+    full mini-batches regardless of which text each chunk came from. The
+    mini-batches match those of iter_chunk_waveforms run with
+    batch_size=target_batch_size on the same entries.
+    
+    Args:
+        texts: Input texts to process
+        base_filename: Base filename, every text gets its own numbered base
+        max_chars: Maximum characters per chunk
+        target_batch_size: Number of chunks per mini-batch
+        
+    Returns:
+        Tuple of (list of (filename, text, batch_slot) entries, batch_groups),
+        batch_slot is the mini-batch an entry belongs to and batch_groups[i]
+        lists the indices of the entries of texts[i]
+    """
+    if target_batch_size < 1:
+        raise ValueError(f"target_batch_size must be at least 1, got {target_batch_size}")
+    
+    entries = []
+    batch_groups = []
+    
+    for i, text in enumerate(texts):
+        chunked = prepare_chunked_texts_soa(text, f"{base_filename}_{i+1:03d}", max_chars)
+        
+        group = []
+        for filename, chunk in zip(chunked.filenames, chunked.texts):
+            group.append(len(entries))
+            entries.append((filename, chunk, len(entries) // target_batch_size))
+        batch_groups.append(group)
+    
+    return entries, batch_groups
+
+
+def _demo():
+    """Chunk a sample Hebrew text and print the resulting parts"""
     logging.basicConfig(level=logging.INFO)
     
     sample_text = """
@@ -280,4 +450,8 @@ if __name__ == "__main__":
     
     for filename, chunk in texts_with_filenames:
         print(f"\n{filename} ({len(chunk)} chars):")
-        print(f"  {chunk[:100]}{'...' if len(chunk) > 100 else ''}")
\ No newline at end of file
+        print(f"  {chunk[:100]}{'...' if len(chunk) > 100 else ''}")
+
+
+if __name__ == "__main__":
+    _demo()